@@ -6,8 +6,11 @@ from plotly.subplots import make_subplots
 import numpy as np
 import json
 import os
-from datetime import datetime, timedelta
+import stat
+import uuid
+from datetime import datetime, timedelta, timezone
 import time
+import threading
 import math
 
 # ページ設定
@@ -18,108 +21,340 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# カスタムCSS
-st.markdown("""
-<style>
-.main-header {
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    padding: 2rem;
-    border-radius: 15px;
-    text-align: center;
-    margin-bottom: 2rem;
-    color: white;
-}
-.selected-stock {
-    background-color: #e8f4fd;
-    padding: 0.5rem;
-    margin: 0.25rem 0;
-    border-radius: 5px;
-    border-left: 4px solid #1f77b4;
-}
-.search-result {
-    background-color: #f8f9fa;
-    padding: 0.25rem;
-    margin: 0.1rem 0;
-    border-radius: 3px;
-}
-</style>
-""", unsafe_allow_html=True)
+# カスタムCSS（起動時の作業ディレクトリに依存しないよう、app.pyと同じフォルダから読む）
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'style.css')
+
+@st.cache_data
+def load_css(path=CSS_PATH):
+    """カスタムCSSを読み込む（読めない場合はスタイルなしで続行）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # セッションステート初期化
 if 'selected_stocks' not in st.session_state:
     st.session_state.selected_stocks = []
 
-@st.cache_data
+STOCK_CSV_PATH = 'data_j.csv'
+STOCK_PARQUET_PATH = 'data_j.parquet'
+STOCK_COLUMNS = ['code', 'name', 'market', 'sector', 'ticker']
+
+def build_stock_data():
+    """CSVから銘柄一覧を作成し、Parquetキャッシュに保存"""
+    source_columns = ['コード', '銘柄名', '市場・商品区分', '33業種区分']
+    df = pd.read_csv(STOCK_CSV_PATH, usecols=source_columns, dtype=str, engine='pyarrow')
+    df = df[source_columns]
+    df = df.rename(columns={
+        'コード': 'code',
+        '銘柄名': 'name',
+        '市場・商品区分': 'market',
+        '33業種区分': 'sector'
+    })
+    df = df[df['market'].isin(['プライム（内国株式）', 'スタンダード（内国株式）', 'グロース（内国株式）'])]
+    df['code'] = df['code'].astype(str).str.zfill(4)
+    df['ticker'] = df['code'] + '.T'
+    df = df[STOCK_COLUMNS].reset_index(drop=True)
+    df = df.astype({'market': 'category', 'sector': 'category'})
+    
+    # 一時ファイルに書き込んでから置き換え、書きかけのParquetを残さない
+    # 書き込めない環境でもCSVからの読み込み結果はそのまま使う
+    tmp_path = f'{STOCK_PARQUET_PATH}.{os.getpid()}.tmp'
+    try:
+        df.to_parquet(tmp_path, index=False, compression='zstd')
+        os.replace(tmp_path, STOCK_PARQUET_PATH)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
+def is_stock_parquet_fresh():
+    """ParquetキャッシュがCSVより新しいか"""
+    if not os.path.exists(STOCK_PARQUET_PATH):
+        return False
+    return os.path.getmtime(STOCK_PARQUET_PATH) >= os.path.getmtime(STOCK_CSV_PATH)
+
+def read_stock_parquet():
+    """Parquetキャッシュを読み込む（壊れている・列が足りない場合はNone）"""
+    try:
+        return pd.read_parquet(STOCK_PARQUET_PATH, columns=STOCK_COLUMNS)
+    except Exception:
+        return None
+
+# 全セッションで同じDataFrameを共有する（読み取り専用として扱い、変更しないこと）
+@st.cache_resource
 def load_stock_data():
-    """株式データを読み込む"""
+    """株式データを読み込む（CSVより新しいParquetキャッシュがあれば優先）"""
     try:
-        df = pd.read_csv('data_j.csv')
-        df = df[['コード', '銘柄名', '市場・商品区分', '33業種区分']].copy()
-        df = df.rename(columns={
-            'コード': 'code',
-            '銘柄名': 'name',
-            '市場・商品区分': 'market',
-            '33業種区分': 'sector'
-        })
-        df = df[df['market'].isin(['プライム（内国株式）', 'スタンダード（内国株式）', 'グロース（内国株式）'])]
-        df['code'] = df['code'].astype(str).str.zfill(4)
-        df['ticker'] = df['code'] + '.T'
-        return df
+        df = read_stock_parquet() if is_stock_parquet_fresh() else None
+        if df is None:
+            df = build_stock_data()
     except Exception as e:
         st.error(f"データファイルの読み込みエラー: {e}")
         return pd.DataFrame()
+    # 検索用にコードと銘柄名を小文字で連結した列を一度だけ作っておく
+    df['search_key'] = (df['code'] + '\t' + df['name']).str.lower()
+    return df
+
+@st.cache_resource
+def load_stock_lookup():
+    """ティッカー → (コード, 銘柄名) の辞書（銘柄ごとの全件検索を避ける）"""
+    df = load_stock_data()
+    return dict(zip(df['ticker'], zip(df['code'], df['name'])))
+
+@st.cache_data(max_entries=256)
+def search_stocks(search_term, limit=20):
+    """銘柄名・コードの部分一致検索（検索語ごとに (ticker, code, name) のリストをキャッシュ）"""
+    df = load_stock_data()
+    # 正規表現を使わない単純な部分一致（記号を含む検索語でもエラーにならない）
+    matched = df[df['search_key'].str.contains(search_term.lower(), regex=False, na=False)].head(limit)
+    return list(zip(matched['ticker'], matched['code'], matched['name']))
+
+def rolling_sum(values, period):
+    """期間ごとの移動合計（累積和の差分でO(N)計算、先頭period-1件とNaNを含む期間はNaN）"""
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        missing = np.isnan(values)
+        cumsum = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+        missing_count = np.concatenate(([0], np.cumsum(missing)))
+        window_sum = cumsum[period:] - cumsum[:-period]
+        window_missing = missing_count[period:] - missing_count[:-period]
+        result[period - 1:] = np.where(window_missing > 0, np.nan, window_sum)
+    return result
 
 def calculate_vwap_bands(df, period=20):
     """TradingView風のVWAPバンド計算（Pine Scriptベース）"""
     if len(df) < period:
         return df
     
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    close = df['Close'].to_numpy(dtype=float)
+    volume = df['Volume'].to_numpy(dtype=float)
+    
     # Typical Price (hlc3)
-    typical_price = (df['High'] + df['Low'] + df['Close']) / 3
+    typical_price = (high + low + close) / 3
     
     # Price * Volume
-    price_volume = typical_price * df['Volume']
-    
-    # 指定期間の移動平均を使用してVWAP計算
-    sum_pv = price_volume.rolling(window=period).sum()
-    sum_vol = df['Volume'].rolling(window=period).sum()
-    vwap_value = sum_pv / sum_vol
+    price_volume = typical_price * volume
     
-    # VWAP基準の偏差計算
-    deviation = typical_price - vwap_value
-    squared_dev = deviation ** 2
+    # 出来高合計が0の期間（売買停止・超低流動性銘柄）は警告を出さずにNaNとする
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 指定期間の移動平均を使用してVWAP計算
+        sum_pv = rolling_sum(price_volume, period)
+        sum_vol = rolling_sum(volume, period)
+        vwap_value = sum_pv / sum_vol
+        
+        # VWAP基準の偏差計算
+        deviation = typical_price - vwap_value
+        squared_dev = deviation ** 2
+        
+        # 加重標準偏差計算
+        weighted_squared_dev = squared_dev * volume
+        sum_weighted_squared_dev = rolling_sum(weighted_squared_dev, period)
+        variance = sum_weighted_squared_dev / sum_vol
+        # 丸め誤差で僅かに負になってもNaNにならないよう0で下限を取る
+        std_dev = np.sqrt(np.maximum(variance, 0.0))
     
-    # 加重標準偏差計算
-    weighted_squared_dev = squared_dev * df['Volume']
-    sum_weighted_squared_dev = weighted_squared_dev.rolling(window=period).sum()
-    variance = sum_weighted_squared_dev / sum_vol
-    std_dev = np.sqrt(variance)
+    # VWAPとバンドを計算（列の追加は一度にまとめて行う）
+    return df.assign(
+        vwap=vwap_value,
+        vwap_upper_1=vwap_value + std_dev,
+        vwap_lower_1=vwap_value - std_dev,
+        vwap_upper_2=vwap_value + 2 * std_dev,
+        vwap_lower_2=vwap_value - 2 * std_dev
+    )
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def prepare_stock_data(df):
+    """取得した株価データの欠損を除きVWAPバンドを付与"""
+    if df is None or df.empty:
+        return None
     
-    # VWAPとバンドを計算
-    df['vwap'] = vwap_value
-    df['vwap_upper_1'] = vwap_value + std_dev
-    df['vwap_lower_1'] = vwap_value - std_dev
-    df['vwap_upper_2'] = vwap_value + 2 * std_dev
-    df['vwap_lower_2'] = vwap_value - 2 * std_dev
+    # チャートに使うOHLCVのみ残す（配当・株式分割などの列はキャッシュしない）
+    df = df[PRICE_COLUMNS]
     
-    return df
+    # 欠損がなければdropnaによるフレーム全体のコピーを省く
+    if df.isna().to_numpy().any():
+        df = df.dropna()
+        if df.empty:
+            return None
+    return calculate_vwap_bands(df)
 
 @st.cache_data(ttl=300)
 def get_stock_data(ticker, period='3mo', interval='1d'):
     """株価データを取得（90日分）"""
     try:
         stock = yf.Ticker(ticker)
-        df = stock.history(period=period, interval=interval)
-        if df.empty:
-            return None
-        
-        df = df.dropna()
-        df = calculate_vwap_bands(df)
-        return df
+        return prepare_stock_data(stock.history(period=period, interval=interval))
     except Exception as e:
         st.error(f"株価データの取得エラー ({ticker}): {e}")
         return None
 
+# 株価データのディスクキャッシュ（プロセス再起動やセッションをまたいで再利用）
+PRICE_CACHE_DIR = os.path.join('.cache', 'prices')
+JST = timezone(timedelta(hours=9))
+MARKET_OPEN = (9, 0)
+# 大引け（15:30）直後は遅延配信で終値が反映されていないことがあるため、この時刻までは短いTTLを使う
+CLOSE_SETTLED = (16, 30)
+INTRADAY_CACHE_TTL = 300
+
+def price_cache_ttl(now=None):
+    """キャッシュの有効秒数（取引時間中と大引け後の確定待ちは5分、それ以外は次の寄り付きまで）"""
+    now = now or datetime.now(JST)
+    open_time = now.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1], second=0, microsecond=0)
+    settled_time = now.replace(hour=CLOSE_SETTLED[0], minute=CLOSE_SETTLED[1], second=0, microsecond=0)
+    if now.weekday() < 5 and open_time <= now < settled_time:
+        return INTRADAY_CACHE_TTL
+    
+    next_open = open_time if now < open_time else open_time + timedelta(days=1)
+    while next_open.weekday() >= 5:
+        next_open += timedelta(days=1)
+    return max(INTRADAY_CACHE_TTL, int((next_open - now).total_seconds()))
+
+def price_cache_path(ticker, period, interval):
+    """ディスクキャッシュのファイルパス（Parquet本体とメタ情報JSON）"""
+    base = os.path.join(PRICE_CACHE_DIR, f"{ticker}_{period}_{interval}")
+    return base + '.parquet', base + '.json'
+
+def read_price_cache(ticker, period, interval):
+    """有効期限内のディスクキャッシュを読み込む（なければNone）"""
+    data_path, meta_path = price_cache_path(ticker, period, interval)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if time.time() >= meta['expires_at']:
+            return None
+        return pd.read_parquet(data_path)
+    except Exception:
+        return None
+
+def write_price_cache(df, ticker, period, interval, ttl):
+    """株価データをディスクキャッシュに保存（失敗しても処理は続行）"""
+    data_path, meta_path = price_cache_path(ticker, period, interval)
+    try:
+        os.makedirs(PRICE_CACHE_DIR, exist_ok=True)
+        df.to_parquet(data_path)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'expires_at': time.time() + ttl}, f)
+    except Exception:
+        pass
+
+# yf.download はモジュール共通の状態（shared._DFS / _ERRORS）を呼び出しごとに初期化し、
+# 取得件数がそろうまで待つため、別セッションから同時に呼ぶと結果が混ざったり終わらなくなる。
+# スクリプトは再実行のたびにモジュールレベルのコードが評価し直されるので、ロックは cache_resource で1つだけ共有する
+@st.cache_resource
+def get_download_lock():
+    """yf.download を直列化するためのロック"""
+    return threading.Lock()
+
+@st.cache_data(ttl=300)
+def get_stocks_bulk(tickers, period='3mo', interval='1d'):
+    """複数銘柄の株価データを一括取得（ディスクキャッシュにない銘柄のみ1回のリクエストで取得）"""
+    results = {}
+    missing = []
+    for ticker in tickers:
+        cached = read_price_cache(ticker, period, interval)
+        if cached is None:
+            missing.append(ticker)
+        else:
+            results[ticker] = prepare_stock_data(cached)
+    if not missing:
+        return results
+    
+    try:
+        with get_download_lock():
+            raw = yf.download(
+                missing,
+                period=period,
+                interval=interval,
+                group_by='ticker',
+                auto_adjust=True,
+                threads=True,
+                progress=False
+            )
+    except Exception as e:
+        st.error(f"株価データの一括取得エラー: {e}")
+        return results
+    if raw is None or raw.empty:
+        return results
+    
+    ttl = price_cache_ttl()
+    for ticker in missing:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if ticker not in raw.columns.get_level_values(0):
+                continue
+            df = raw[ticker]
+        else:
+            df = raw
+        results[ticker] = prepare_stock_data(df)
+        if results[ticker] is not None:
+            write_price_cache(df[PRICE_COLUMNS], ticker, period, interval, ttl)
+    return results
+
+# チャート操作設定（マウスホイールでの拡大縮小を有効化）
+CHART_CONFIG = {
+    'scrollZoom': True,
+    'displayModeBar': True,
+    'displaylogo': False
+}
+
+# チャートの配色・スタイル（日本式: 陽線=赤、陰線=緑）
+CANDLE_INCREASING = {'line': {'color': '#FF6B6B'}, 'fillcolor': '#FF6B6B'}
+CANDLE_DECREASING = {'line': {'color': '#00D4AA'}, 'fillcolor': '#00D4AA'}
+AXIS_GRID_STYLE = dict(
+    showgrid=True,
+    gridwidth=0.3,
+    gridcolor='rgba(128,128,128,0.2)',
+    tickfont=dict(size=8)
+)
+
+# レイアウト（トレーディングビュー風）
+CHART_LAYOUT = dict(
+    title=dict(
+        text="<b>📈 日本株マルチチャート - 日足 (ドラッグで期間変更)</b>",
+        font=dict(size=20, color='#2C3E50'),
+        x=0.5
+    ),
+    height=900,
+    template="plotly_white",
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='white',
+    font=dict(size=10, family="Arial, sans-serif"),
+    margin=dict(l=20, r=20, t=60, b=20),
+    dragmode='pan',  # ドラッグでパン可能
+    showlegend=False
+)
+
+# 4列×3行のパネル位置 (row, col)
+PANEL_POSITIONS = tuple(((i // 4) + 1, (i % 4) + 1) for i in range(12))
+
+# 描画に使う列（float32配列に変換してPlotlyへ渡す）
+CHART_COLUMNS = (
+    'Open', 'High', 'Low', 'Close',
+    'vwap', 'vwap_upper_1', 'vwap_lower_1', 'vwap_upper_2', 'vwap_lower_2'
+)
+
+def format_date_labels(index):
+    """日付インデックスを 'MM/DD' 形式の文字列配列に変換（NumPyで一括処理）"""
+    # タイムゾーン付きの場合は現地時刻のまま日付に切り捨てる（UTCに変換すると日付がずれる）
+    days = index.tz_localize(None).to_numpy(dtype='datetime64[D]')
+    month_day = np.char.partition(np.datetime_as_string(days, unit='D'), '-')[:, 2]
+    return np.char.replace(month_day, '-', '/')
+
+def band_polygon(x_values, upper, lower):
+    """上下バンドを fill='toself' 用の閉じた多角形の座標に変換（NaN区間は除外）"""
+    valid = ~(np.isnan(upper) | np.isnan(lower))
+    x = x_values[valid]
+    return np.concatenate([x, x[::-1]]), np.concatenate([upper[valid], lower[valid][::-1]])
+
+# 同じ銘柄データなら作成済みのFigureを再利用する（共有オブジェクトなので変更しないこと）
+@st.cache_resource(max_entries=16, show_spinner=False)
 def create_multi_chart(selected_stocks_data):
     """12銘柄のマルチチャート作成（トレーディングビュー風ドラッグ対応）"""
     if not selected_stocks_data or len(selected_stocks_data) == 0:
@@ -134,177 +369,186 @@ def create_multi_chart(selected_stocks_data):
         subplot_titles=[f"{data['name'][:8]}({data['code']})" for data in selected_stocks_data[:12]]
     )
 
+    traces, trace_rows, trace_cols = [], [], []
     for i, stock_data in enumerate(selected_stocks_data[:12]):
         if stock_data['data'] is None or stock_data['data'].empty:
             continue
         
         df = stock_data['data']
-        row = (i // 4) + 1
-        col = (i % 4) + 1
+        row, col = PANEL_POSITIONS[i]
         
         # 休日を詰めるために日付を文字列に変換
-        x_values = df.index.strftime('%m/%d').tolist()
+        x_values = format_date_labels(df.index)
+        
+        # 描画する列は一度だけfloat32配列に変換（Plotlyの型付き配列送信で転送量を削減）
+        values = {column: df[column].to_numpy(dtype=np.float32) for column in CHART_COLUMNS if column in df.columns}
+        has_vwap = 'vwap' in values and not np.isnan(values['vwap']).all()
+        has_bands = 'vwap_upper_1' in values and not np.isnan(values['vwap_upper_1']).all()
         
         # ローソク足チャート
-        fig.add_trace(
+        panel_traces = [
             go.Candlestick(
                 x=x_values,
-                open=df['Open'],
-                high=df['High'],
-                low=df['Low'],
-                close=df['Close'],
+                open=values['Open'],
+                high=values['High'],
+                low=values['Low'],
+                close=values['Close'],
                 name=stock_data['name'],
-                decreasing={'line': {'color': '#00D4AA'}, 'fillcolor': '#00D4AA'},
-                increasing={'line': {'color': '#FF6B6B'}, 'fillcolor': '#FF6B6B'},
+                decreasing=CANDLE_DECREASING,
+                increasing=CANDLE_INCREASING,
                 showlegend=False
-            ),
-            row=row, col=col
-        )
+            )
+        ]
 
         # VWAP
-        if 'vwap' in df.columns and not df['vwap'].isna().all():
-            fig.add_trace(
-                go.Scatter(
+        if has_vwap:
+            panel_traces.append(
+                go.Scattergl(
                     x=x_values,
-                    y=df['vwap'],
+                    y=values['vwap'],
                     mode='lines',
                     name=f'VWAP_{i}',
                     line=dict(color='#0066FF', width=2),
                     showlegend=False,
                     hoverinfo='skip'
-                ),
-                row=row, col=col
+                )
             )
 
         # VWAPバンド（2σ - 外側、赤色）
-        if 'vwap_upper_2' in df.columns and not df['vwap_upper_2'].isna().all():
-            fig.add_trace(
-                go.Scatter(
-                    x=x_values,
-                    y=df['vwap_upper_2'],
+        if has_bands:
+            band_x, band_y = band_polygon(x_values, values['vwap_upper_2'], values['vwap_lower_2'])
+            panel_traces.append(
+                go.Scattergl(
+                    x=band_x,
+                    y=band_y,
                     mode='lines',
                     line=dict(color='rgba(255, 107, 107, 0.8)', width=1, dash='dot'),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ),
-                row=row, col=col
-            )
-            
-            fig.add_trace(
-                go.Scatter(
-                    x=x_values,
-                    y=df['vwap_lower_2'],
-                    mode='lines',
-                    line=dict(color='rgba(255, 107, 107, 0.8)', width=1, dash='dot'),
-                    fill='tonexty',
+                    fill='toself',
                     fillcolor='rgba(255, 107, 107, 0.1)',
                     showlegend=False,
                     hoverinfo='skip'
-                ),
-                row=row, col=col
+                )
             )
 
         # VWAPバンド（1σ - 内側、グレー）
-        if 'vwap_upper_1' in df.columns and not df['vwap_upper_1'].isna().all():
-            fig.add_trace(
-                go.Scatter(
-                    x=x_values,
-                    y=df['vwap_upper_1'],
+        if has_bands:
+            band_x, band_y = band_polygon(x_values, values['vwap_upper_1'], values['vwap_lower_1'])
+            panel_traces.append(
+                go.Scattergl(
+                    x=band_x,
+                    y=band_y,
                     mode='lines',
                     line=dict(color='rgba(128, 128, 128, 0.6)', width=1, dash='dash'),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ),
-                row=row, col=col
-            )
-            
-            fig.add_trace(
-                go.Scatter(
-                    x=x_values,
-                    y=df['vwap_lower_1'],
-                    mode='lines',
-                    line=dict(color='rgba(128, 128, 128, 0.6)', width=1, dash='dash'),
-                    fill='tonexty',
+                    fill='toself',
                     fillcolor='rgba(128, 128, 128, 0.1)',
                     showlegend=False,
                     hoverinfo='skip'
-                ),
-                row=row, col=col
+                )
             )
 
+        traces.extend(panel_traces)
+        trace_rows.extend([row] * len(panel_traces))
+        trace_cols.extend([col] * len(panel_traces))
+
+    # 全パネルのトレースをまとめて一度に追加
+    if traces:
+        fig.add_traces(traces, rows=trace_rows, cols=trace_cols)
+
     # レイアウト更新（トレーディングビュー風）
-    fig.update_layout(
-        title=dict(
-            text=f"<b>📈 日本株マルチチャート - 日足 (ドラッグで期間変更)</b>",
-            font=dict(size=20, color='#2C3E50'),
-            x=0.5
-        ),
-        height=900,
-        template="plotly_white",
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='white',
-        font=dict(size=10, family="Arial, sans-serif"),
-        margin=dict(l=20, r=20, t=60, b=20),
-        dragmode='pan',  # ドラッグでパン可能
-        showlegend=False
-    )
+    fig.update_layout(**CHART_LAYOUT)
 
     # 各サブプロットのX軸設定（トレーディングビュー風）
-    for i in range(1, 13):
-        row = ((i-1) // 4) + 1
-        col = ((i-1) % 4) + 1
+    for (row, col), stock_data in zip(PANEL_POSITIONS, selected_stocks_data):
+        df = stock_data['data']
+        if df is None or df.empty:
+            continue
         
         # 最新20日分を初期表示に設定
-        if selected_stocks_data and len(selected_stocks_data) > i-1 and selected_stocks_data[i-1]['data'] is not None:
-            df = selected_stocks_data[i-1]['data']
-            if not df.empty:
-                total_length = len(df)
-                start_range = max(0, total_length - 20)  # 最新20日分
-                x_values = df.index.strftime('%m/%d').tolist()
-                
-                fig.update_xaxes(
-                    type='category',
-                    range=[start_range, total_length - 1],  # 最新20日分を表示
-                    showgrid=True,
-                    gridwidth=0.3,
-                    gridcolor='rgba(128,128,128,0.2)',
-                    tickangle=45,
-                    tickfont=dict(size=8),
-                    rangeslider_visible=False,
-                    row=row, col=col
-                )
+        total_length = len(df)
+        start_range = max(0, total_length - 20)  # 最新20日分
+        
+        fig.update_xaxes(
+            type='category',
+            range=[start_range, total_length - 1],  # 最新20日分を表示
+            tickangle=45,
+            rangeslider_visible=False,
+            **AXIS_GRID_STYLE,
+            row=row, col=col
+        )
 
     # Y軸の設定
-    fig.update_yaxes(
-        showgrid=True,
-        gridwidth=0.3,
-        gridcolor='rgba(128,128,128,0.2)',
-        tickfont=dict(size=8)
-    )
+    fig.update_yaxes(**AXIS_GRID_STYLE)
 
     return fig
 
+WATCHLIST_DIR = 'watchlists'
+
+def watchlist_path(name):
+    """ウォッチリストのファイルパス"""
+    return os.path.join(WATCHLIST_DIR, f'{name}.json')
+
 def save_watchlist(name, tickers):
-    """ウォッチリストを保存"""
-    if not os.path.exists('watchlists'):
-        os.makedirs('watchlists')
-    with open(f'watchlists/{name}.json', 'w', encoding='utf-8') as f:
-        json.dump(tickers, f, ensure_ascii=False, indent=2)
+    """ウォッチリストを保存（一時ファイルに書き込んでから置き換え、書きかけのファイルを残さない）"""
+    os.makedirs(WATCHLIST_DIR, exist_ok=True)
+    path = watchlist_path(name)
+    tmp_path = os.path.join(WATCHLIST_DIR, f'.tmp_{uuid.uuid4().hex}.json.tmp')
+    # 通常のopenと同じくumaskに従った権限で作成する（mkstempだと0600になる）
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(tickers, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # 上書き保存では既存ファイルの権限を引き継ぐ
+        if os.path.exists(path):
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 def load_watchlist(name):
     """ウォッチリストを読み込み"""
     try:
-        with open(f'watchlists/{name}.json', 'r', encoding='utf-8') as f:
+        with open(watchlist_path(name), 'r', encoding='utf-8') as f:
             return json.load(f)
     except:
         return []
 
+@st.cache_data(max_entries=1)
+def scan_watchlist_names(dir_mtime_ns):
+    """watchlistsフォルダ内のリスト名を取得（最新の更新時刻の結果だけをキャッシュ）"""
+    return [f[:-5] for f in os.listdir(WATCHLIST_DIR) if f.endswith('.json')]
+
 def get_watchlist_names():
     """保存されたウォッチリスト名を取得"""
-    if not os.path.exists('watchlists'):
+    try:
+        dir_mtime_ns = os.stat(WATCHLIST_DIR).st_mtime_ns
+    except FileNotFoundError:
         return []
-    files = [f[:-5] for f in os.listdir('watchlists') if f.endswith('.json')]
-    return files
+    return scan_watchlist_names(dir_mtime_ns)
+
+def add_picked_stocks():
+    """検索結果から選んだ銘柄を選択中リストに追加（最大12銘柄）"""
+    for ticker in st.session_state.picked_stocks:
+        if ticker not in st.session_state.selected_stocks and len(st.session_state.selected_stocks) < 12:
+            st.session_state.selected_stocks.append(ticker)
+    st.session_state.picked_stocks = []
+
+def remove_stock(ticker):
+    """選択中リストから銘柄を削除"""
+    if ticker in st.session_state.selected_stocks:
+        st.session_state.selected_stocks.remove(ticker)
+
+def clear_stocks():
+    """選択中の銘柄を全て削除"""
+    st.session_state.selected_stocks = []
+
+def apply_watchlist(name):
+    """ウォッチリストの銘柄を選択中リストに読み込む（重複は順序を保って除去）"""
+    st.session_state.selected_stocks = list(dict.fromkeys(load_watchlist(name)))[:12]
+    st.toast(f"'{name}'を読み込みました")
 
 def main():
     # ヘッダー
@@ -321,6 +565,7 @@ def main():
     if stock_df.empty:
         st.error("株式データの読み込みに失敗しました。")
         return
+    stock_lookup = load_stock_lookup()
     
     # サイドバー
     with st.sidebar:
@@ -330,25 +575,19 @@ def main():
         st.subheader("📋 選択中の銘柄")
         if st.session_state.selected_stocks:
             for i, ticker in enumerate(st.session_state.selected_stocks):
-                stock_info = stock_df[stock_df['ticker'] == ticker]
-                if not stock_info.empty:
-                    name = stock_info.iloc[0]['name']
-                    code = stock_info.iloc[0]['code']
+                if ticker in stock_lookup:
+                    code, name = stock_lookup[ticker]
                     
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         st.markdown(f'<div class="selected-stock">{code} {name[:12]}</div>', 
                                   unsafe_allow_html=True)
                     with col2:
-                        if st.button("❌", key=f"remove_{i}"):
-                            st.session_state.selected_stocks.remove(ticker)
-                            st.rerun()
+                        st.button("❌", key=f"remove_{i}", on_click=remove_stock, args=(ticker,))
         else:
             st.info("銘柄を選択してください")
         
-        if st.button("🗑️ 全て削除"):
-            st.session_state.selected_stocks = []
-            st.rerun()
+        st.button("🗑️ 全て削除", on_click=clear_stocks)
         
         # 銘柄検索エリア
         st.subheader("🔍 銘柄検索・追加")
@@ -356,23 +595,39 @@ def main():
         
         # 検索結果表示
         if search_term:
-            filtered_df = stock_df[
-                (stock_df['name'].str.contains(search_term, na=False, case=False)) |
-                (stock_df['code'].str.contains(search_term, na=False, case=False))
-            ].head(20)
+            search_results = search_stocks(search_term)
             
-            st.write("**検索結果:**")
-            for _, row in filtered_df.iterrows():
-                if len(st.session_state.selected_stocks) >= 12:
-                    st.warning("最大12銘柄まで選択可能です")
-                    break
-                
-                if row['ticker'] not in st.session_state.selected_stocks:
-                    if st.button(f"➕ {row['code']} {row['name'][:20]}", key=f"add_{row['ticker']}"):
-                        st.session_state.selected_stocks.append(row['ticker'])
-                        st.rerun()
+            remaining = 12 - len(st.session_state.selected_stocks)
+            if not search_results:
+                st.info("該当する銘柄が見つかりません")
+            elif remaining <= 0:
+                st.warning("最大12銘柄まで選択可能です")
+            else:
+                # 検索結果ごとのボタンではなく1つのマルチセレクトで追加する（ウィジェット数を削減）
+                labels = {
+                    ticker: f"{code} {name[:20]}"
+                    for ticker, code, name in search_results
+                    if ticker not in st.session_state.selected_stocks
+                }
+                if labels:
+                    st.multiselect(
+                        "検索結果から追加",
+                        options=list(labels),
+                        format_func=labels.get,
+                        max_selections=remaining,
+                        placeholder="追加する銘柄を選択",
+                        key="picked_stocks",
+                        on_change=add_picked_stocks
+                    )
+                    already_selected = [
+                        f"{code} {name[:20]}"
+                        for ticker, code, name in search_results
+                        if ticker in st.session_state.selected_stocks
+                    ]
+                    if already_selected:
+                        st.caption("✅ 選択済み: " + "、".join(already_selected))
                 else:
-                    st.write(f"✅ {row['code']} {row['name'][:20]} (選択済み)")
+                    st.info("検索結果の銘柄はすべて選択済みです")
         
         # ウォッチリスト管理
         st.subheader("⭐ ウォッチリスト")
@@ -388,11 +643,7 @@ def main():
             if selected_watchlist:
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("📥 読み込み"):
-                        watchlist_tickers = load_watchlist(selected_watchlist)
-                        st.session_state.selected_stocks = watchlist_tickers[:12]
-                        st.success(f"'{selected_watchlist}'を読み込みました")
-                        st.rerun()
+                    st.button("📥 読み込み", on_click=apply_watchlist, args=(selected_watchlist,))
                 
                 with col2:
                     if st.button("💾 上書き保存"):
@@ -418,20 +669,19 @@ def main():
         st.info("💡 **操作方法:** チャートをドラッグして期間移動、マウスホイールで拡大縮小、ダブルクリックでズームリセット")
         
         with st.spinner("チャートを読み込み中..."):
-            # 各銘柄のデータを取得
-            selected_stocks_data = []
-            progress_bar = st.progress(0)
+            # 全銘柄のデータを一括取得（90日分）
+            tickers = tuple(st.session_state.selected_stocks)
+            bulk_data = get_stocks_bulk(tickers, '3mo', '1d')
             
-            for i, ticker in enumerate(st.session_state.selected_stocks):
-                stock_info = stock_df[stock_df['ticker'] == ticker]
-                if not stock_info.empty:
-                    name = stock_info.iloc[0]['name']
-                    code = stock_info.iloc[0]['code']
-                else:
-                    name = ticker
-                    code = ticker.replace('.T', '')
+            selected_stocks_data = []
+            for ticker in tickers:
+                code, name = stock_lookup.get(ticker, (ticker.replace('.T', ''), ticker))
                 
-                stock_data = get_stock_data(ticker, '3mo', '1d')  # 90日分取得
+                if ticker in bulk_data:
+                    stock_data = bulk_data[ticker]
+                else:
+                    # 一括取得に含まれなかった銘柄は個別に取得
+                    stock_data = get_stock_data(ticker, '3mo', '1d')
                 
                 selected_stocks_data.append({
                     'ticker': ticker,
@@ -439,16 +689,12 @@ def main():
                     'code': code,
                     'data': stock_data
                 })
-                
-                progress_bar.progress((i + 1) / len(st.session_state.selected_stocks))
-            
-            progress_bar.empty()
             
             # マルチチャート作成
             multi_chart = create_multi_chart(selected_stocks_data)
             
             if multi_chart:
-                st.plotly_chart(multi_chart, use_container_width=True)
+                st.plotly_chart(multi_chart, use_container_width=True, config=CHART_CONFIG)
                 
                 # 銘柄別最新価格
                 st.subheader("💰 銘柄別最新価格")
@@ -457,14 +703,15 @@ def main():
                 for i, stock_data in enumerate(selected_stocks_data[:12]):
                     with cols[i % 4]:
                         if stock_data['data'] is not None and not stock_data['data'].empty:
-                            latest = stock_data['data'].iloc[-1]
-                            prev_close = stock_data['data'].iloc[-2]['Close'] if len(stock_data['data']) > 1 else latest['Close']
-                            change = latest['Close'] - prev_close
+                            closes = stock_data['data']['Close'].to_numpy()
+                            last_close = closes[-1]
+                            prev_close = closes[-2] if len(closes) > 1 else last_close
+                            change = last_close - prev_close
                             change_pct = (change / prev_close) * 100 if prev_close != 0 else 0
                             
                             st.metric(
                                 label=f"{stock_data['code']} {stock_data['name'][:8]}",
-                                value=f"¥{latest['Close']:,.0f}",
+                                value=f"¥{last_close:,.0f}",
                                 delta=f"{change_pct:+.2f}%"
                             )
                         else: